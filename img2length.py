@@ -1,13 +1,13 @@
 import sys
 import os
-from PIL import Image
-
-# Increase the maximum image size that Pillow can handle
-Image.MAX_IMAGE_PIXELS = None  # Remove the limit entirely
+import functools
+import threading
 
+from PySide6.QtCore import QObject, Signal
 from PySide6.QtWidgets import QApplication, QMainWindow, QFileDialog, QMessageBox, QDialog, QCheckBox, QPushButton
 from form_ui import Ui_Img2Length
 from ui_folderInfo import Ui_InfoDialog
+from scan_service import ScanCancelled, ScanClient, format_length, scan_folder
 
 class FolderInfoDialog(QDialog):
     def __init__(self, parent=None):
@@ -15,6 +15,42 @@ class FolderInfoDialog(QDialog):
         self.ui = Ui_InfoDialog()
         self.ui.setupUi(self)
 
+class ScanWorker(QObject):
+    # Every signal carries the scan generation so the window can ignore
+    # results from scans that were superseded while they were running
+    progress = Signal(int, int, int)
+    succeeded = Signal(int, object)
+    failed = Signal(int, str)
+
+    def __init__(self, generation, scan, folder_path, include_subfolders):
+        super().__init__()
+        self.generation = generation
+        self.scan = scan
+        self.folder_path = folder_path
+        self.include_subfolders = include_subfolders
+        self.cancel_event = threading.Event()
+
+    def start(self):
+        # A daemon thread, so closing the window never waits on a slow scan
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def report_progress(self, done, total):
+        self.progress.emit(self.generation, done, total)
+
+    def run(self):
+        try:
+            result = self.scan(self.folder_path, self.include_subfolders, progress=self.report_progress,
+                               cancelled=self.cancel_event.is_set)
+        except ScanCancelled:
+            return
+        except Exception as e:
+            self.failed.emit(self.generation, str(e))
+        else:
+            self.succeeded.emit(self.generation, result)
+
 class Img2Length(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -32,8 +68,24 @@ class Img2Length(QMainWindow):
         # Connect the actionFolder_Info menu item to show the dialog
         self.ui.actionFolder_Info.triggered.connect(self.folder_info_dialog.show)
 
+        # Rescan the current folder, bypassing any cached result on the scan service
+        self.rescan_action = self.ui.menuInfo.addAction("Rescan Folder")
+        self.rescan_action.setShortcut("F5")
+        self.rescan_action.triggered.connect(self.rescan_folder)
+
         self.folder_path = ""
 
+        # Use a shared scan service instead of scanning in-process when configured
+        service_url = os.environ.get("IMG2LENGTH_SERVICE_URL")
+        self.scan_client = ScanClient(service_url) if service_url else None
+
+        # State of the latest background scan; superseded workers are cancelled
+        # and any results they still deliver are ignored
+        self.scan_generation = 0
+        self.scan_key = None
+        self.scan_result = None
+        self.scan_worker = None
+
         #self.folder_info_dialog = QDialog(self) -- Removing this fixed the phantom unpopulated dialog.
         self.folder_info_ui = Ui_InfoDialog()
         self.folder_info_ui.setupUi(self.folder_info_dialog)
@@ -49,76 +101,11 @@ class Img2Length(QMainWindow):
         if folder_path:
             self.folder_path = folder_path
             self.ui.folder_label.setText(f"Selected Folder: {folder_path}")
-            self.update_conversion()
-
-    def convert_pixels(self, folder_path, unit, include_subfolders):
-        total_length = 0
-
-        if include_subfolders:
-            # Iterate over all files in the folder and its subfolders
-            for root, dirs, files in os.walk(folder_path):
-                for filename in files:
-                    if filename.endswith(".jpg") or filename.endswith(".jpeg") or filename.endswith(".png"):
-                        # Open the image and get its width
-                        image_path = os.path.join(root, filename)
-                        image = Image.open(image_path)
-                        width, _ = image.size
-
-                        # Convert the width to the chosen unit and add it to the total length
-                        conversion_factors = {
-                            "mile": 0.000000164578833,
-                            "meter": 0.0002645833,
-                            "yard": 0.0002893912,
-                            "km": 0.0000002645833,
-                            "cm": 0.02645833,
-                            "mm": 0.2645833
-                        }
-                        total_length += width * conversion_factors[unit]
-        else:
-            # Iterate over all image files in the folder (excluding subfolders)
-            for filename in os.listdir(folder_path):
-                if filename.endswith(".jpg") or filename.endswith(".jpeg") or filename.endswith(".png"):
-                    # Open the image and get its width
-                    image_path = os.path.join(folder_path, filename)
-                    image = Image.open(image_path)
-                    width, _ = image.size
-
-                    # Convert the width to the chosen unit and add it to the total length
-                    conversion_factors = {
-                            "mile": 0.000000164578833,
-                            "meter": 0.0002645833,
-                            "yard": 0.0002893912,
-                            "km": 0.0000002645833,
-                            "cm": 0.02645833,
-                            "mm": 0.2645833
-                    }
-                    total_length += width * conversion_factors[unit]
-
-        return f"Total Length: {total_length:.2f} {unit}"
-
-    # def update_conversion(self):
-    #     if self.folder_path:
-    #         unit = self.ui.unitComboBox.currentText()
-    #     else:
-    #         unit = None
-    #     include_subfolders = self.ui.SubfoldersCheckBox.isChecked()
-    #     try:
-    #         converted_length = self.convert_pixels(self.folder_path, unit, include_subfolders)
-    #         self.ui.converted_label.setText(converted_length)
-
-    #         # Extract metadata and update folder info dialog
-    #         total_count, total_file_size, unique_dimensions_count, min_resolution, max_resolution = self.extract_metadata(self.folder_path, include_subfolders)
-    #         self.folder_info_ui.ttlImgLabel.setText(str(total_count))
-    #         self.folder_info_ui.ttFileSizeLabel.setText(f"{total_file_size / (1024 * 1024):.2f} MB")
-    #         self.folder_info_ui.uniqueDimLabel.setText(str(unique_dimensions_count))
-    #         self.folder_info_ui.smallResLabel.setText(f"{min_resolution[0]} x {min_resolution[1]}")
-    #         self.folder_info_ui.highResLabel.setText(f"{max_resolution[0]} x {max_resolution[1]}")
-
-    #         # Show the folder info dialog
-    #         self.folder_info_dialog.show()
-    #     except Exception as e:
-    #         QMessageBox.critical(self, "Error", str(e))
+            self.start_scan((folder_path, self.ui.SubfoldersCheckBox.isChecked()))
 
+    def rescan_folder(self):
+        if self.folder_path:
+            self.start_scan((self.folder_path, self.ui.SubfoldersCheckBox.isChecked()), refresh=True)
 
     def update_conversion(self):
         unit = self.ui.unitComboBox.currentText()
@@ -128,70 +115,83 @@ class Img2Length(QMainWindow):
             self.ui.converted_label.setText(f"Selected unit: {unit}")
             return
 
-        try:
-            converted_length = self.convert_pixels(self.folder_path, unit, include_subfolders)
-            self.ui.converted_label.setText(str(converted_length))
-            self.update_folder_info(include_subfolders)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
-            
-    def update_folder_info(self, include_subfolders):
-        try:
-            total_count, total_file_size, unique_dimensions_count, min_resolution, max_resolution = self.extract_metadata(self.folder_path, include_subfolders)
-            self.folder_info_ui.ttlImgLabel.setText(str(total_count))
-            self.folder_info_ui.ttFileSizeLabel.setText(f"{total_file_size / (1024 * 1024):.2f} MB")
-            self.folder_info_ui.uniqueDimLabel.setText(str(unique_dimensions_count))
-            self.folder_info_ui.smallResLabel.setText(f"{min_resolution[0]} x {min_resolution[1]}")
-            self.folder_info_ui.highResLabel.setText(f"{max_resolution[0]} x {max_resolution[1]}")
-
-            self.folder_info_dialog.show()
-        except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
-            
-    def extract_metadata(self, folder_path, include_subfolders):
-        # Initialize variables to store metadata and statistics
-        total_count = 0
-        total_file_size = 0
-        unique_dimensions = set()
-        min_resolution = (float('inf'), float('inf'))
-        max_resolution = (0, 0)
-
-        if include_subfolders:
-            # Iterate over all files in the folder and its subfolders
-            for root, dirs, files in os.walk(folder_path):
-                for filename in files:
-                    if filename.endswith(".jpg") or filename.endswith(".jpeg") or filename.endswith(".png"):
-                        # Open the image and extract metadata
-                        image_path = os.path.join(root, filename)
-                        image = Image.open(image_path)
-                        width, height = image.size
-                        file_size = os.path.getsize(image_path)
-
-                        # Update metadata and statistics
-                        total_count += 1
-                        total_file_size += file_size
-                        unique_dimensions.add((width, height))
-                        min_resolution = min(min_resolution, (width, height), key=lambda x: x[0] * x[1])
-                        max_resolution = max(max_resolution, (width, height), key=lambda x: x[0] * x[1])
+        key = (self.folder_path, include_subfolders)
+        if key != self.scan_key:
+            self.start_scan(key)
+        elif self.scan_result is not None:
+            self.show_scan_result()
+        # Otherwise the running scan shows its result in the current unit
+
+    def start_scan(self, key, refresh=False):
+        if self.scan_worker is not None:
+            self.scan_worker.cancel()
+
+        self.scan_generation += 1
+        self.scan_key = key
+        self.scan_result = None
+        self.ui.progressBar.setValue(0)
+        # Don't leave the previous folder's figures up while this one is scanned
+        self.ui.converted_label.setText("Scanning...")
+        self.clear_folder_info()
+
+        if self.scan_client is not None:
+            scan = functools.partial(self.scan_client.scan, refresh=refresh)
         else:
-            # Iterate over all image files in the folder (excluding subfolders)
-            for filename in os.listdir(folder_path):
-                if filename.endswith(".jpg") or filename.endswith(".jpeg") or filename.endswith(".png"):
-                    # Open the image and extract metadata
-                    image_path = os.path.join(folder_path, filename)
-                    image = Image.open(image_path)
-                    width, height = image.size
-                    file_size = os.path.getsize(image_path)
-
-                    # Update metadata and statistics
-                    total_count += 1
-                    total_file_size += file_size
-                    unique_dimensions.add((width, height))
-                    min_resolution = min(min_resolution, (width, height), key=lambda x: x[0] * x[1])
-                    max_resolution = max(max_resolution, (width, height), key=lambda x: x[0] * x[1])
-
-        # Return the collected metadata and statistics
-        return total_count, total_file_size, len(unique_dimensions), min_resolution, max_resolution
+            scan = scan_folder
+        self.scan_worker = ScanWorker(self.scan_generation, scan, *key)
+        self.scan_worker.progress.connect(self.update_progress)
+        self.scan_worker.succeeded.connect(self.scan_succeeded)
+        self.scan_worker.failed.connect(self.scan_failed)
+        self.scan_worker.start()
+
+    def update_progress(self, generation, done, total):
+        if generation != self.scan_generation:
+            return
+        self.ui.progressBar.setMaximum(max(total, 1))
+        self.ui.progressBar.setValue(done)
+
+    def scan_succeeded(self, generation, result):
+        if generation != self.scan_generation:
+            return
+        self.scan_result = result
+        self.ui.progressBar.setValue(self.ui.progressBar.maximum())
+        self.show_scan_result()
+
+    def scan_failed(self, generation, message):
+        if generation != self.scan_generation:
+            return
+        # Forget the failed inputs so the next change retries the scan
+        self.scan_key = None
+        self.ui.converted_label.setText(f"Selected unit: {self.ui.unitComboBox.currentText()}")
+        self.ui.progressBar.setValue(0)
+        QMessageBox.critical(self, "Error", message)
+
+    def show_scan_result(self):
+        unit = self.ui.unitComboBox.currentText()
+        result = self.scan_result
+        self.ui.converted_label.setText(format_length(result["total_width"], unit))
+        self.show_folder_info(result["total_count"], result["total_file_size"], result["unique_dimensions_count"],
+                              result["min_resolution"], result["max_resolution"])
+
+    def closeEvent(self, event):
+        if self.scan_worker is not None:
+            self.scan_worker.cancel()
+        super().closeEvent(event)
+
+    def clear_folder_info(self):
+        for label in (self.folder_info_ui.ttlImgLabel, self.folder_info_ui.ttFileSizeLabel,
+                      self.folder_info_ui.uniqueDimLabel, self.folder_info_ui.smallResLabel,
+                      self.folder_info_ui.highResLabel):
+            label.setText("")
+
+    def show_folder_info(self, total_count, total_file_size, unique_dimensions_count, min_resolution, max_resolution):
+        self.folder_info_ui.ttlImgLabel.setText(str(total_count))
+        self.folder_info_ui.ttFileSizeLabel.setText(f"{total_file_size / (1024 * 1024):.2f} MB")
+        self.folder_info_ui.uniqueDimLabel.setText(str(unique_dimensions_count))
+        self.folder_info_ui.smallResLabel.setText(f"{min_resolution[0]} x {min_resolution[1]}")
+        self.folder_info_ui.highResLabel.setText(f"{max_resolution[0]} x {max_resolution[1]}")
+
+        self.folder_info_dialog.show()
 
 
 if __name__ == "__main__":
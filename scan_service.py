@@ -0,0 +1,521 @@
+import sys
+import os
+import json
+import time
+import uuid
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from PIL import Image
+
+# Increase the maximum image size that Pillow can handle
+Image.MAX_IMAGE_PIXELS = None  # Remove the limit entirely
+
+# This module must stay importable without Qt so the service can run headless.
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+CONVERSION_FACTORS = {
+    "mile": 0.000000164578833,
+    "meter": 0.0002645833,
+    "yard": 0.0002893912,
+    "km": 0.0000002645833,
+    "cm": 0.02645833,
+    "mm": 0.2645833
+}
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Seconds a finished job can still be looked up by id
+JOB_RETENTION = 600
+
+# Seconds a cached scan is trusted before its folder fingerprint is checked again
+FINGERPRINT_RECHECK = 5
+
+# Seconds between keepalive lines on an idle event stream, which is also how
+# long a client may take to notice it was cancelled
+EVENT_KEEPALIVE = 2
+
+
+class ScanCancelled(Exception):
+    pass
+
+
+def check_cancelled(cancelled):
+    if cancelled is not None and cancelled():
+        raise ScanCancelled()
+
+
+def list_images(folder_path, include_subfolders, cancelled=None):
+    if include_subfolders:
+        # Iterate over all files in the folder and its subfolders
+        image_paths = []
+        for root, dirs, files in os.walk(folder_path):
+            check_cancelled(cancelled)
+            for filename in files:
+                if filename.endswith(IMAGE_EXTENSIONS):
+                    image_paths.append(os.path.join(root, filename))
+        return image_paths
+
+    # Only image files directly inside the folder (excluding subfolders)
+    return [os.path.join(folder_path, filename) for filename in os.listdir(folder_path)
+            if filename.endswith(IMAGE_EXTENSIONS)]
+
+
+def folder_fingerprint(folder_path, include_subfolders):
+    # Directory mtimes change whenever files are added, removed or renamed, which
+    # is enough to tell a cached scan is stale without opening any image
+    if not include_subfolders:
+        return os.stat(folder_path).st_mtime_ns
+    return tuple((root, os.stat(root).st_mtime_ns) for root, dirs, files in os.walk(folder_path))
+
+
+def scan_folder(folder_path, include_subfolders, progress=None, cancelled=None):
+    # Collect widths and folder statistics in a single pass. The result is
+    # unit independent so one scan can answer requests for any unit.
+    image_paths = list_images(folder_path, include_subfolders, cancelled)
+    total = len(image_paths)
+
+    total_width = 0
+    total_file_size = 0
+    unique_dimensions = set()
+    min_resolution = None
+    max_resolution = (0, 0)
+
+    for done, image_path in enumerate(image_paths, start=1):
+        check_cancelled(cancelled)
+        with Image.open(image_path) as image:
+            width, height = image.size
+
+        total_width += width
+        total_file_size += os.path.getsize(image_path)
+        unique_dimensions.add((width, height))
+        if min_resolution is None or width * height < min_resolution[0] * min_resolution[1]:
+            min_resolution = (width, height)
+        if width * height > max_resolution[0] * max_resolution[1]:
+            max_resolution = (width, height)
+
+        if progress is not None:
+            progress(done, total)
+
+    return {
+        "total_width": total_width,
+        "total_count": total,
+        "total_file_size": total_file_size,
+        "unique_dimensions_count": len(unique_dimensions),
+        "min_resolution": list(min_resolution or (0, 0)),
+        "max_resolution": list(max_resolution),
+    }
+
+
+def format_length(total_width, unit):
+    total_length = total_width * CONVERSION_FACTORS[unit]
+    return f"Total Length: {total_length:.2f} {unit}"
+
+
+class ScanJob:
+    def __init__(self, key, fingerprint=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.fingerprint = fingerprint
+        self.checked_at = time.monotonic()
+        self.state = "queued"
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self.condition = threading.Condition()
+
+    def update(self, **changes):
+        with self.condition:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.condition.notify_all()
+
+    def snapshot(self):
+        with self.condition:
+            return {
+                "job_id": self.id,
+                "folder": self.key[0],
+                "include_subfolders": self.key[1],
+                "state": self.state,
+                "done": self.done,
+                "total": self.total,
+                "result": self.result,
+                "error": self.error,
+            }
+
+    def finished(self):
+        return self.state in ("done", "failed")
+
+    def wait_for_change(self, last_snapshot, timeout):
+        # Block until the job differs from what the caller last saw
+        with self.condition:
+            self.condition.wait_for(lambda: self.finished() or
+                                    (self.state, self.done) != (last_snapshot["state"], last_snapshot["done"]),
+                                    timeout)
+        return self.snapshot()
+
+
+class ScanManager:
+    def __init__(self, workers=4, cache_ttl=300, roots=()):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+        self.cache_ttl = cache_ttl
+        # When set, only folders inside one of these directories can be scanned
+        self.roots = [os.path.realpath(root) for root in roots]
+        self.lock = threading.Lock()
+        self.jobs = {}
+        # Latest job per (folder, include_subfolders). A pending job here is
+        # shared by identical concurrent requests; a finished one is the cache.
+        self.by_key = {}
+
+    def submit(self, folder_path, include_subfolders, refresh=False):
+        folder_path = os.path.realpath(folder_path)
+        if self.roots and not any(os.path.commonpath([root, folder_path]) == root for root in self.roots):
+            raise PermissionError(f"Folder is outside the allowed roots: {folder_path}")
+        if not os.path.isdir(folder_path):
+            raise ValueError(f"Folder not found: {folder_path}")
+        key = (folder_path, bool(include_subfolders))
+
+        with self.lock:
+            self.expire()
+            job = self.by_key.get(key)
+            # Identical concurrent requests share the running scan
+            if job is not None and not job.finished():
+                return job
+            if job is None or refresh or not self.is_fresh(job):
+                return self.start(key)
+            now = time.monotonic()
+            if now - job.checked_at < FINGERPRINT_RECHECK:
+                return job
+            # Claim the check so concurrent requests keep using the cache
+            # instead of all walking the same tree at once
+            job.checked_at = now
+
+        fingerprint = folder_fingerprint(*key)
+
+        with self.lock:
+            current = self.by_key.get(key)
+            if current is not None and not current.finished():
+                return current
+            if current is job and job.fingerprint == fingerprint:
+                return job
+            return self.start(key, fingerprint)
+
+    def start(self, key, fingerprint=None):
+        # Called with the lock held
+        job = ScanJob(key, fingerprint)
+        self.jobs[job.id] = job
+        self.by_key[key] = job
+        self.executor.submit(self.run, job)
+        return job
+
+    def is_fresh(self, job):
+        return job.state == "done" and time.monotonic() - job.finished_at < self.cache_ttl
+
+    def expire(self):
+        # Finished jobs stay reachable by id for a while after they stop being
+        # the cached entry, so clients still following them get their result.
+        now = time.monotonic()
+        retention = max(self.cache_ttl, JOB_RETENTION)
+        for job_id, job in list(self.jobs.items()):
+            if job.finished() and now - job.finished_at > retention:
+                del self.jobs[job_id]
+        for key, job in list(self.by_key.items()):
+            if job.finished() and not self.is_fresh(job):
+                del self.by_key[key]
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def run(self, job):
+        job.update(state="running")
+        try:
+            # Taken before the scan starts, so changes made while scanning make
+            # the result stale rather than being missed
+            if job.fingerprint is None:
+                job.update(fingerprint=folder_fingerprint(*job.key), checked_at=time.monotonic())
+            result = scan_folder(*job.key, progress=lambda done, total: job.update(done=done, total=total))
+        except Exception as e:
+            job.update(state="failed", error=str(e), finished_at=time.monotonic())
+        else:
+            job.update(state="done", result=result, finished_at=time.monotonic())
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_job_request(body):
+    # Validate a POST /jobs body strictly; bool("false") would be True
+    try:
+        request = json.loads(body or b"{}")
+    except ValueError:
+        raise ValueError("Request body is not valid JSON")
+    if not isinstance(request, dict):
+        raise ValueError("Request body must be a JSON object")
+
+    folder = request.get("folder")
+    if not isinstance(folder, str) or not folder:
+        raise ValueError('"folder" must be a non-empty string')
+    flags = {}
+    for name in ("include_subfolders", "refresh"):
+        flags[name] = request.get(name, False)
+        if not isinstance(flags[name], bool):
+            raise ValueError(f'"{name}" must be true or false')
+    return folder, flags["include_subfolders"], flags["refresh"]
+
+
+class ScanRequestHandler(BaseHTTPRequestHandler):
+    server_version = "Img2LengthScan/1.0"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/jobs":
+            self.send_json(404, {"error": "Not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = self.server.manager.submit(*parse_job_request(self.rfile.read(length)))
+        except PermissionError as e:
+            self.send_json(403, {"error": str(e)})
+            return
+        except (ValueError, OSError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+
+        self.send_json(202, job.snapshot())
+
+    def do_GET(self):
+        parts = urlparse(self.path).path.strip("/").split("/")
+        job = self.server.manager.get(parts[1]) if len(parts) >= 2 and parts[0] == "jobs" else None
+        if job is None:
+            self.send_json(404, {"error": "Unknown job"})
+        elif len(parts) == 2:
+            self.send_json(200, job.snapshot())
+        elif len(parts) == 3 and parts[2] == "events":
+            self.stream_events(job)
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def stream_events(self, job):
+        # Newline-delimited JSON, one line per change, closed once the job finishes
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+
+        snapshot = job.snapshot()
+        while True:
+            try:
+                self.wfile.write(json.dumps(snapshot).encode("utf-8") + b"\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped following the job; the scan carries on
+                return
+            if snapshot["state"] in ("done", "failed"):
+                return
+            snapshot = job.wait_for_change(snapshot, timeout=EVENT_KEEPALIVE)
+
+
+class ScanServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many clients connect at once when a team shares one service
+    request_queue_size = 128
+
+    def __init__(self, address, manager, quiet=False):
+        super().__init__(address, ScanRequestHandler)
+        self.manager = manager
+        self.quiet = quiet
+
+
+class ScanClientError(Exception):
+    pass
+
+
+class ScanClient:
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, payload=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise ScanClientError(self.error_message(e))
+        except OSError as e:
+            raise ScanClientError(f"Scan service unavailable: {e}")
+
+    def error_message(self, error):
+        # Prefer the service's own message, but the error page may come from a
+        # proxy or some other server and not be JSON at all
+        try:
+            payload = json.loads(error.read())
+        except (OSError, ValueError):
+            return str(error)
+        if isinstance(payload, dict) and payload.get("error"):
+            return str(payload["error"])
+        return str(error)
+
+    def submit(self, folder_path, include_subfolders, refresh=False):
+        return self.request("POST", "/jobs", {"folder": folder_path, "include_subfolders": include_subfolders,
+                                              "refresh": refresh})
+
+    def status(self, job_id):
+        return self.request("GET", f"/jobs/{job_id}")
+
+    def events(self, job_id):
+        try:
+            with urllib.request.urlopen(f"{self.url}/jobs/{job_id}/events", timeout=self.timeout) as response:
+                for line in response:
+                    if line.strip():
+                        yield json.loads(line)
+        except urllib.error.HTTPError as e:
+            raise ScanClientError(self.error_message(e))
+        except OSError as e:
+            raise ScanClientError(f"Scan service unavailable: {e}")
+
+    def scan(self, folder_path, include_subfolders, progress=None, refresh=False, cancelled=None):
+        snapshot = self.submit(folder_path, include_subfolders, refresh)
+        if snapshot["state"] not in ("done", "failed"):
+            for snapshot in self.events(snapshot["job_id"]):
+                # Leaving the loop closes the stream; the shared scan carries on
+                check_cancelled(cancelled)
+                if progress is not None:
+                    progress(snapshot["done"], snapshot["total"])
+
+        if snapshot["state"] != "done":
+            raise ScanClientError(snapshot["error"] or "Scan did not finish")
+        return snapshot["result"]
+
+
+def serve(host, port, workers, cache_ttl, roots=(), quiet=False):
+    manager = ScanManager(workers=workers, cache_ttl=cache_ttl, roots=roots)
+    server = ScanServer((host, port), manager, quiet=quiet)
+    print(f"Img2Length scan service listening on http://{host}:{server.server_port}")
+    if not manager.roots:
+        print("Warning: no --root given, any folder readable by this process can be scanned")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        manager.shutdown()
+
+
+def load_test(url, folder_path, include_subfolders, clients, rounds):
+    # Hammer a running service with many concurrent clients asking for the same
+    # folder, then report latency and how many distinct jobs were actually run.
+    client = ScanClient(url, timeout=300)
+    latencies = []
+    job_ids = set()
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(rounds):
+            started = time.perf_counter()
+            try:
+                snapshot = client.submit(folder_path, include_subfolders)
+                for snapshot in client.events(snapshot["job_id"]):
+                    pass
+                if snapshot["state"] != "done":
+                    raise ScanClientError(snapshot["error"])
+            except ScanClientError as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                job_ids.add(snapshot["job_id"])
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"Requests: {clients * rounds}  ok: {len(latencies)}  failed: {len(errors)}")
+    print(f"Distinct scan jobs: {len(job_ids)}")
+    print(f"Elapsed: {elapsed:.2f}s  throughput: {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        print(f"Latency p50: {latencies[len(latencies) // 2] * 1000:.1f} ms  "
+              f"p95: {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms  "
+              f"max: {latencies[-1] * 1000:.1f} ms")
+    for error in sorted(set(errors)):
+        print(f"Error: {error}")
+    return not errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Img2Length shared scan service")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Run the scan service")
+    serve_parser.add_argument("--host", default=DEFAULT_HOST)
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--workers", type=int, default=4)
+    serve_parser.add_argument("--cache-ttl", type=float, default=300, help="Seconds a finished scan is reused")
+    serve_parser.add_argument("--root", action="append", default=[],
+                              help="Only allow scanning inside this directory (repeatable)")
+    serve_parser.add_argument("--quiet", action="store_true")
+
+    load_parser = commands.add_parser("loadtest", help="Run many concurrent clients against a service")
+    load_parser.add_argument("folder")
+    load_parser.add_argument("--url", help="Service to test; starts a local one when omitted")
+    load_parser.add_argument("--clients", type=int, default=50)
+    load_parser.add_argument("--rounds", type=int, default=5)
+    load_parser.add_argument("--subfolders", action="store_true")
+    load_parser.add_argument("--workers", type=int, default=4)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.workers, args.cache_ttl, args.root, args.quiet)
+        return 0
+
+    server = None
+    url = args.url
+    if url is None:
+        manager = ScanManager(workers=args.workers)
+        server = ScanServer((DEFAULT_HOST, 0), manager, quiet=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://{DEFAULT_HOST}:{server.server_port}"
+
+    try:
+        ok = load_test(url, args.folder, args.subfolders, args.clients, args.rounds)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            server.manager.shutdown()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())